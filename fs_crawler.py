@@ -1,230 +1,472 @@
 import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import hashlib
 import os
 import sqlite3
-from datetime import datetime
 import sys
 
+try:
+    from blake3 import blake3
+except ImportError:
+    blake3 = None
+
+# Bump whenever schema.sql changes in a way existing databases can't pick up
+SCHEMA_VERSION = 1
+# STRICT tables were added in SQLite 3.37
+MIN_SQLITE_VERSION = (3, 37, 0)
+
 def init_database():
-    """Initialize the SQLite database with schema"""
+    """Initialize the SQLite database with schema and return a tuned connection"""
+    if sqlite3.sqlite_version_info < MIN_SQLITE_VERSION:
+        required = '.'.join(map(str, MIN_SQLITE_VERSION))
+        print(f"Error: SQLite {required} or newer is required "
+              f"(this Python uses {sqlite3.sqlite_version})", file=sys.stderr)
+        sys.exit(1)
+    
     conn = sqlite3.connect('filesystem.db')
+    
+    user_version = conn.execute('PRAGMA user_version').fetchone()[0]
+    has_tables = conn.execute('''
+        SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'scan_runs'
+    ''').fetchone()
+    if has_tables and user_version != SCHEMA_VERSION:
+        print("Error: filesystem.db was created by an incompatible version of this tool. "
+              "Move it aside and rescan to rebuild the database.", file=sys.stderr)
+        sys.exit(1)
+    
+    # Trade per-statement fsyncs for WAL + NORMAL sync; safe against app crashes
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA temp_store=MEMORY')
+    conn.execute('PRAGMA cache_size=-65536')
+    # Lets deleting a scan run cascade to its file entries
+    conn.execute('PRAGMA foreign_keys=ON')
     with open('schema.sql', 'r') as schema_file:
         conn.executescript(schema_file.read())
-    conn.close()
+    conn.execute(f'PRAGMA user_version={SCHEMA_VERSION}')
+    return conn
+
+HASH_CHUNK_SIZE = 1 << 20
+HASH_DIGEST_SIZE = 16
+# Hashes from different algorithms never match, so each scan run records which one it used
+HASH_ALGORITHM = 'blake3' if blake3 is not None else 'md5'
+# Every empty file has the same digest, so it is computed once instead of per file
+EMPTY_HASH = (
+    blake3(b'').digest(length=HASH_DIGEST_SIZE) if blake3 is not None
+    else hashlib.md5(b'').digest()
+)
+INSERT_BATCH_SIZE = 10000
+
+# Rebuilds each interned directory's path from its chain of parents; bind :sep to os.sep
+DIR_PATHS_CTE = '''
+    dir_paths(dir_id, path) AS (
+        SELECT dir_id, name
+        FROM directories
+        WHERE parent_id = 0
+        UNION ALL
+        SELECT d.dir_id, p.path || :sep || d.name
+        FROM directories d
+        JOIN dir_paths p ON d.parent_id = p.dir_id
+    )'''
 
-def calculate_md5(filepath):
-    """Calculate MD5 hash of a file"""
-    md5_hash = hashlib.md5()
-    with open(filepath, "rb") as f:
-        for chunk in iter(lambda: f.read(4096), b""):
-            md5_hash.update(chunk)
-    return md5_hash.hexdigest()
+def calculate_hash(filepath):
+    """Calculate a raw 16-byte content digest of a file using HASH_ALGORITHM"""
+    if blake3 is not None:
+        # Files are already hashed in parallel, so BLAKE3 stays single-threaded per file
+        content_hash = blake3()
+        if hasattr(content_hash, 'update_mmap'):
+            content_hash.update_mmap(filepath)
+            return content_hash.digest(length=HASH_DIGEST_SIZE)
+        # Older blake3 releases lack update_mmap; stream the file below instead
+    with open(filepath, "rb", buffering=0) as f:
+        if hasattr(os, 'posix_fadvise'):
+            # Ask the kernel for aggressive readahead so reads overlap device latency
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        if blake3 is None:
+            if hasattr(hashlib, 'file_digest'):
+                # Python 3.11+: the read/update loop runs entirely in C
+                return hashlib.file_digest(f, 'md5').digest()
+            content_hash = hashlib.md5()
+        # Reuse one large buffer instead of allocating per chunk
+        buf = bytearray(HASH_CHUNK_SIZE)
+        view = memoryview(buf)
+        while True:
+            size = f.readinto(buf)
+            if not size:
+                break
+            content_hash.update(view[:size])
+        # BLAKE3 output is extendable, so its first 16 bytes equal digest(length=16)
+        return content_hash.digest()[:HASH_DIGEST_SIZE]
 
-def get_file_times(filepath):
-    """Get creation and modification times of a file"""
-    stats = os.stat(filepath)
+def get_inode(stats):
+    """Get a stat result's inode folded into SQLite's signed 64-bit INTEGER range"""
+    # Some network/FUSE mounts report inodes >= 2**63, and ReFS file IDs are 128-bit
+    return ((stats.st_ino + (1 << 63)) % (1 << 64)) - (1 << 63)
+
+def get_file_times(stats):
+    """Get creation and modification times from a stat result as Unix timestamps"""
     # Use either st_birthtime (macOS) or st_ctime (other platforms) for creation time
     created = getattr(stats, 'st_birthtime', stats.st_ctime)
     modified = stats.st_mtime
+    return created, modified
+
+def iter_files(base_path):
+    """Yield a DirEntry for every regular file below base_path"""
+    stack = [base_path]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        yield entry
+        except (PermissionError, FileNotFoundError, NotADirectoryError) as e:
+            print(f"Error processing {directory}: {e}", file=sys.stderr)
+
+def get_dir_id(cursor, dir_cache, dir_path):
+    """Return the interned directory id for dir_path, creating its chain as needed"""
+    dir_id = dir_cache.get(dir_path)
+    if dir_id is not None:
+        return dir_id
+    
+    parent_path, sep, name = dir_path.rpartition(os.sep)
+    parent_id = get_dir_id(cursor, dir_cache, parent_path) if sep else 0
+    cursor.execute('''
+        INSERT OR IGNORE INTO directories (parent_id, name)
+        VALUES (?, ?)
+    ''', (parent_id, name))
+    cursor.execute('''
+        SELECT dir_id
+        FROM directories
+        WHERE parent_id = ? AND name = ?
+    ''', (parent_id, name))
+    dir_id = cursor.fetchone()[0]
+    dir_cache[dir_path] = dir_id
+    return dir_id
+
+def build_file_entry(run_id, dir_id, entry):
+    """Stat a single file, returning its file_entries row (hashed only if empty)"""
+    stats = entry.stat(follow_symlinks=False)
+    created_time, modified_time = get_file_times(stats)
+    content_hash = EMPTY_HASH if stats.st_size == 0 else None
     return (
-        datetime.fromtimestamp(created),
-        datetime.fromtimestamp(modified)
+        run_id, dir_id, entry.name, stats.st_size, get_inode(stats), content_hash,
+        created_time, modified_time
     )
 
-def scan_filesystem(conn, run_id, base_path):
-    """Recursively scan filesystem and store file information"""
+def reuse_previous_hashes(conn, run_id):
+    """Copy hashes from earlier runs for files whose size, mtime and inode are unchanged"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        UPDATE file_entries AS f
+        SET content_hash = (
+            SELECT p.content_hash
+            FROM file_entries p
+            WHERE p.dir_id = f.dir_id
+            AND p.filename = f.filename
+            AND p.size = f.size
+            AND p.modified_time = f.modified_time
+            AND p.inode = f.inode
+            AND p.run_id != f.run_id
+            AND p.content_hash IS NOT NULL
+            AND p.run_id IN (SELECT run_id FROM scan_runs WHERE hash_algorithm = ?)
+            ORDER BY p.run_id DESC
+            LIMIT 1
+        )
+        WHERE f.run_id = ?
+        AND f.content_hash IS NULL
+    ''', (HASH_ALGORITHM, run_id))
+
+def hash_unchanged_file(full_path, size, modified_time, inode):
+    """Hash a file only if it still matches the size, mtime and inode recorded for it"""
+    try:
+        stats = os.stat(full_path, follow_symlinks=False)
+    except (FileNotFoundError, NotADirectoryError):
+        # Rows from earlier runs may point at drives that are no longer mounted
+        return None
+    if (stats.st_size, stats.st_mtime, get_inode(stats)) != (size, modified_time, inode):
+        return None
+    return calculate_hash(full_path)
+
+def hash_size_collisions(conn, run_id):
+    """Hash every unhashed file whose size matches another indexed file"""
     cursor = conn.cursor()
     
-    for root, _, files in os.walk(base_path):
-        for filename in files:
-            full_path = os.path.join(root, filename)
+    # A file with a unique size cannot have a duplicate, so only collisions are hashed.
+    # Earlier runs are included because their unique sizes may now collide with this one,
+    # but their rows only get a hash if the file on disk is provably the one they recorded.
+    # Rows with the same path, size, mtime and inode are the same file seen by several runs:
+    # they count once towards a collision and are hashed once.
+    cursor.execute('''
+        WITH RECURSIVE ''' + DIR_PATHS_CTE + ''',
+        FileVersions AS (
+            SELECT DISTINCT dir_id, filename, size, modified_time, inode
+            FROM file_entries
+            WHERE size IN (SELECT size FROM file_entries WHERE run_id = :run_id)
+        )
+        SELECT f.dir_id, f.filename, f.size, f.modified_time, f.inode,
+            dp.path || :sep || f.filename
+        FROM file_entries f
+        JOIN dir_paths dp ON f.dir_id = dp.dir_id
+        WHERE f.content_hash IS NULL
+        AND f.run_id IN (SELECT run_id FROM scan_runs WHERE hash_algorithm = :algorithm)
+        AND f.size IN (
+            SELECT size
+            FROM FileVersions
+            GROUP BY size
+            HAVING COUNT(*) > 1
+        )
+        GROUP BY f.dir_id, f.filename, f.size, f.modified_time, f.inode
+    ''', {'sep': os.sep, 'run_id': run_id, 'algorithm': HASH_ALGORITHM})
+    candidates = cursor.fetchall()
+    
+    hashes = []
+    # hashlib and blake3 release the GIL while hashing, so threads overlap I/O and hashing
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        futures = {
+            executor.submit(hash_unchanged_file, full_path, size, modified_time, inode):
+                (dir_id, filename, size, modified_time, inode, full_path)
+            for dir_id, filename, size, modified_time, inode, full_path in candidates
+        }
+        for future in as_completed(futures):
+            dir_id, filename, size, modified_time, inode, full_path = futures[future]
             try:
-                relative_path = os.path.relpath(full_path, base_path)
-                md5_hash = calculate_md5(full_path)
-                created_time, modified_time = get_file_times(full_path)
-                
-                cursor.execute('''
-                    INSERT INTO file_entries 
-                    (run_id, filename, full_path, relative_path, md5_hash, created_time, modified_time)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    run_id, filename, full_path, relative_path, md5_hash,
-                    created_time.isoformat(), modified_time.isoformat()
-                ))
-                
+                content_hash = future.result()
             except (PermissionError, FileNotFoundError) as e:
                 print(f"Error processing {full_path}: {e}", file=sys.stderr)
                 continue
+            if content_hash is not None:
+                hashes.append((content_hash, dir_id, filename, size, modified_time, inode))
+    
+    # Write each digest to every run's row for that unchanged file
+    cursor.executemany('''
+        UPDATE file_entries
+        SET content_hash = ?
+        WHERE dir_id = ? AND filename = ? AND size = ? AND modified_time = ? AND inode = ?
+        AND content_hash IS NULL
+        AND run_id IN (SELECT run_id FROM scan_runs WHERE hash_algorithm = ?)
+    ''', [row + (HASH_ALGORITHM,) for row in hashes])
+
+def scan_filesystem(conn, run_id, base_path):
+    """Recursively scan filesystem and store file information"""
+    cursor = conn.cursor()
+    insert_sql = '''
+        INSERT INTO file_entries 
+        (run_id, dir_id, filename, size, inode, content_hash, created_time, modified_time)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    '''
+    pending = []
+    # Maps each directory path seen in this scan to its interned dir_id
+    dir_cache = {}
+    
+    # Insert everything in one transaction so the journal is synced once
+    conn.execute('BEGIN IMMEDIATE')
+    for entry in iter_files(base_path):
+        try:
+            # Slice the parent directory off entry.path rather than calling os.path.dirname
+            dir_id = get_dir_id(cursor, dir_cache, entry.path[:-len(entry.name) - 1])
+            pending.append(build_file_entry(run_id, dir_id, entry))
+        except (PermissionError, FileNotFoundError) as e:
+            print(f"Error processing {entry.path}: {e}", file=sys.stderr)
+            continue
+        if len(pending) >= INSERT_BATCH_SIZE:
+            cursor.executemany(insert_sql, pending)
+            pending.clear()
+    cursor.executemany(insert_sql, pending)
     
+    reuse_previous_hashes(conn, run_id)
+    hash_size_collisions(conn, run_id)
     conn.commit()
+    
+    # Refresh planner statistics so the analysis queries pick up the indexes
+    conn.execute('ANALYZE')
 
 def clear_path_entries(conn, base_path):
     """Delete all file entries for a given base path"""
     cursor = conn.cursor()
     
-    # Find all run_ids associated with this base path
+    # File entries are removed by ON DELETE CASCADE; total_changes counts those rows too
+    changes_before = conn.total_changes
     cursor.execute('''
-        SELECT run_id 
-        FROM scan_runs 
+        DELETE FROM scan_runs 
         WHERE base_path = ?
     ''', (base_path,))
+    deleted_runs = cursor.rowcount
+    deleted_files = conn.total_changes - changes_before - deleted_runs
     
-    run_ids = cursor.fetchall()
-    if not run_ids:
+    if not deleted_runs:
         print(f"No scans found for path: {base_path}")
         return
     
-    # Delete file entries for these runs
-    run_id_list = ','.join(str(rid[0]) for rid in run_ids)
-    cursor.execute(f'''
-        DELETE FROM file_entries 
-        WHERE run_id IN ({run_id_list})
-    ''')
-    
-    # Delete the scan runs
+    # Drop directories no longer holding any file, directly or through a subdirectory
     cursor.execute('''
-        DELETE FROM scan_runs 
-        WHERE base_path = ?
-    ''', (base_path,))
-    
-    deleted_files = cursor.rowcount
+        WITH RECURSIVE live_dirs(dir_id) AS (
+            SELECT DISTINCT dir_id FROM file_entries
+            UNION
+            SELECT d.parent_id
+            FROM directories d
+            JOIN live_dirs l ON d.dir_id = l.dir_id
+            WHERE d.parent_id != 0
+        )
+        DELETE FROM directories
+        WHERE dir_id NOT IN (SELECT dir_id FROM live_dirs)
+    ''')
     conn.commit()
     print(f"Cleared {deleted_files} entries for path: {base_path}")
 
-def find_duplicates(conn):
-    """Find files that share the same filename and MD5 hash"""
+def find_modified_files(conn):
+    """Find files that share the same name but have different content hashes"""
     cursor = conn.cursor()
     
     cursor.execute('''
-        WITH DuplicateGroups AS (
-            SELECT filename, md5_hash, full_path
+        WITH RECURSIVE ''' + DIR_PATHS_CTE + ''',
+        ChangedNames AS (
+            -- Files with unique sizes are never hashed, so a size change also counts
+            SELECT filename
             FROM file_entries
-            GROUP BY filename, md5_hash, full_path
-            HAVING COUNT(*) > 1
+            GROUP BY filename
+            HAVING COUNT(DISTINCT size) > 1
+            UNION
+            -- Hashes are only comparable between runs that used the same algorithm
+            SELECT fe.filename
+            FROM file_entries fe
+            JOIN scan_runs s ON fe.run_id = s.run_id
+            GROUP BY fe.filename, s.hash_algorithm
+            HAVING COUNT(DISTINCT fe.content_hash) > 1
         ),
-        UniqueDuplicates AS (
-            SELECT filename, md5_hash
+        UnverifiedNames AS (
+            -- Same name and size but some version was never hashed (e.g. its drive was
+            -- unplugged before a same-sized file appeared), so the content may differ
+            SELECT filename
             FROM file_entries
-            GROUP BY filename, md5_hash
-            HAVING COUNT(DISTINCT full_path) > 1
-        )
-        SELECT 
-            f.filename,
-            f.md5_hash,
-            f.full_path,
-            sr.run_identifier
-        FROM file_entries f
-        JOIN scan_runs sr ON f.run_id = sr.run_id
-        JOIN UniqueDuplicates ud ON f.filename = ud.filename 
-            AND f.md5_hash = ud.md5_hash
-        ORDER BY f.filename, f.md5_hash, sr.run_identifier
-    ''')
-    
-    duplicates = cursor.fetchall()
-    if not duplicates:
-        print("No duplicate files found.")
-        return
-    
-    current_key = None
-    for filename, md5_hash, path, run_id in duplicates:
-        key = (filename, md5_hash)
-        if key != current_key:
-            print(f"\nDuplicate file: {filename}")
-            print(f"MD5 Hash: {md5_hash}")
-            current_key = key
-        print(f"  Run '{run_id}': {path}")
-
-def find_modified_files(conn):
-    """Find files that share the same name but have different MD5 hashes"""
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        WITH FileVersions AS (
+            GROUP BY filename, size
+            HAVING COUNT(content_hash) < COUNT(*)
+            AND COUNT(DISTINCT dir_id || ':' || modified_time || ':' || inode) > 1
+        ),
+        FileVersions AS (
             SELECT 
                 f.filename,
-                f.md5_hash,
-                f.full_path,
+                f.content_hash,
+                f.size,
+                f.dir_id,
                 f.modified_time,
                 sr.run_identifier,
                 ROW_NUMBER() OVER (
                     PARTITION BY f.filename 
-                    ORDER BY datetime(f.modified_time) DESC
+                    ORDER BY f.modified_time DESC
                 ) as version_rank
             FROM file_entries f
             JOIN scan_runs sr ON f.run_id = sr.run_id
-            WHERE f.filename IN (
-                SELECT filename
-                FROM file_entries
-                GROUP BY filename
-                HAVING COUNT(DISTINCT md5_hash) > 1
-            )
+            WHERE f.filename IN (SELECT filename FROM ChangedNames)
+            OR f.filename IN (SELECT filename FROM UnverifiedNames)
         )
         SELECT 
-            filename,
-            md5_hash,
-            full_path,
-            modified_time,
-            run_identifier,
-            version_rank
-        FROM FileVersions
-        GROUP BY filename, md5_hash, full_path
-        ORDER BY filename, version_rank
-    ''')
-    
-    results = cursor.fetchall()
-    if not results:
-        print("No modified files found.")
-        return
+            fv.filename,
+            fv.filename NOT IN (SELECT filename FROM ChangedNames),
+            fv.content_hash,
+            fv.size,
+            dp.path || :sep || fv.filename,
+            datetime(fv.modified_time, 'unixepoch', 'localtime'),
+            fv.run_identifier,
+            fv.version_rank
+        FROM FileVersions fv
+        JOIN dir_paths dp ON fv.dir_id = dp.dir_id
+        GROUP BY fv.filename, fv.content_hash, fv.size, fv.dir_id
+        ORDER BY fv.filename, fv.version_rank
+    ''', {'sep': os.sep})
     
+    # Stream rows straight from the cursor so memory stays flat on large result sets
     current_file = None
-    for filename, md5_hash, path, mod_time, run_id, rank in results:
+    for filename, unverified, content_hash, size, path, mod_time, run_id, rank in cursor:
         if filename != current_file:
-            print(f"\nFile: {filename}")
+            note = " (unverified: same size, not every version was hashed)" if unverified else ""
+            print(f"\nFile: {filename}{note}")
             current_file = filename
         
         latest = " (Latest version)" if rank == 1 else ""
         print(f"  Run '{run_id}': {path}")
         print(f"    Modified: {mod_time}")
-        print(f"    MD5: {md5_hash}{latest}")
+        print(f"    Size: {size}")
+        print(f"    Hash: {content_hash.hex() if content_hash else 'not hashed'}{latest}")
+    
+    if current_file is None:
+        print("No modified files found.")
 
 def find_duplicates(conn):
-    """Find files that share the same filename and MD5 hash"""
+    """Find files that share the same filename and content hash"""
     cursor = conn.cursor()
     
+    # Files are only hashed while their size collides with a mounted file, so a row from
+    # an unplugged drive may never get a hash. Same-name, same-size groups containing such
+    # a row are reported too, marked as unverified.
     cursor.execute('''
-        WITH DuplicateGroups AS (
-            SELECT filename, md5_hash
-            FROM file_entries
-            GROUP BY filename, md5_hash
-            HAVING COUNT(*) > 1
+        WITH RECURSIVE ''' + DIR_PATHS_CTE + ''',
+        Entries AS (
+            SELECT
+                f.filename,
+                f.content_hash,
+                f.size,
+                f.dir_id,
+                sr.run_identifier,
+                sr.scan_timestamp,
+                COUNT(*) OVER (PARTITION BY f.filename, f.content_hash) AS hash_copies,
+                COUNT(*) OVER (PARTITION BY f.filename, f.size) AS size_copies,
+                COUNT(f.content_hash) OVER (PARTITION BY f.filename, f.size) AS size_hashed
+            FROM file_entries f
+            JOIN scan_runs sr ON f.run_id = sr.run_id
+        ),
+        HashGroups AS (
+            SELECT filename, 1 AS verified, content_hash AS group_key, dir_id,
+                run_identifier, scan_timestamp
+            FROM Entries
+            WHERE content_hash IS NOT NULL AND hash_copies > 1
+            UNION ALL
+            SELECT filename, 0, size, dir_id, run_identifier, scan_timestamp
+            FROM Entries
+            WHERE size_copies > 1 AND size_hashed < size_copies
         )
-        SELECT DISTINCT
-            f.filename,
-            f.md5_hash,
-            f.full_path,
-            sr.run_identifier,
-            sr.scan_timestamp
-        FROM file_entries f
-        JOIN scan_runs sr ON f.run_id = sr.run_id
-        JOIN DuplicateGroups d ON f.filename = d.filename 
-            AND f.md5_hash = d.md5_hash
-        GROUP BY f.filename, f.md5_hash, f.full_path, sr.run_identifier
-        ORDER BY f.filename, f.md5_hash, sr.run_identifier
-    ''')
-    
-    duplicates = cursor.fetchall()
-    if not duplicates:
-        print("No duplicate files found.")
-        return
+        SELECT
+            hg.filename,
+            hg.verified,
+            hg.group_key,
+            dp.path || :sep || hg.filename,
+            hg.run_identifier,
+            hg.scan_timestamp
+        FROM HashGroups hg
+        JOIN dir_paths dp ON hg.dir_id = dp.dir_id
+        GROUP BY hg.filename, hg.verified, hg.group_key, hg.dir_id, hg.run_identifier
+        ORDER BY hg.filename, hg.verified DESC, hg.group_key, hg.run_identifier
+    ''', {'sep': os.sep})
     
+    # Stream rows straight from the cursor so memory stays flat on large result sets
     current_key = None
-    for filename, md5_hash, path, run_id, scan_timestamp in duplicates:
-        key = (filename, md5_hash)
+    for filename, verified, group_key, path, run_id, scan_timestamp in cursor:
+        key = (filename, verified, group_key)
         if key != current_key:
-            print(f"\nDuplicate file: {filename} at {scan_timestamp}")
-            print(f"MD5 Hash: {md5_hash}")
+            if verified:
+                print(f"\nDuplicate file: {filename} at {scan_timestamp}")
+                print(f"Content Hash: {group_key.hex()}")
+            else:
+                print(f"\nPossible duplicate file (unverified): {filename} at {scan_timestamp}")
+                print(f"Size: {group_key} bytes, not every copy was hashed")
             current_key = key
         print(f"  Run '{run_id}': {path}")
+    
+    if current_key is None:
+        print("No duplicate files found.")
+
+def buffer_stderr():
+    """Block-buffer stderr so error-heavy scans don't pay a write syscall per message"""
+    try:
+        fd = sys.stderr.fileno()
+    except (AttributeError, OSError, ValueError):
+        # No stderr (pythonw) or an in-memory replacement such as io.StringIO: leave it be
+        return
+    # Keep the interpreter's error handler so undecodable filenames can still be reported
+    sys.stderr = open(fd, 'w', buffering=65536, closefd=False,
+                      encoding=sys.stderr.encoding, errors=sys.stderr.errors)
 
 def main():
     parser = argparse.ArgumentParser(description='Filesystem crawler and indexer')
@@ -251,22 +493,25 @@ def main():
         parser.print_help()
         sys.exit(1)
     
-    init_database()
-    conn = sqlite3.connect('filesystem.db')
+    buffer_stderr()
+    conn = init_database()
     
     try:
         if args.command == 'scan':
             if not os.path.exists(args.path):
                 print(f"Error: Path '{args.path}' does not exist", file=sys.stderr)
                 sys.exit(1)
+            if not os.path.isdir(args.path):
+                print(f"Error: Path '{args.path}' is not a directory", file=sys.stderr)
+                sys.exit(1)
                 
             cursor = conn.cursor()
             
             # Create scan run entry
             cursor.execute('''
-                INSERT INTO scan_runs (run_identifier, drive_name, base_path)
-                VALUES (?, ?, ?)
-            ''', (args.run_identifier, args.drive_name, args.path))
+                INSERT INTO scan_runs (run_identifier, drive_name, base_path, hash_algorithm)
+                VALUES (?, ?, ?, ?)
+            ''', (args.run_identifier, args.drive_name, args.path, HASH_ALGORITHM))
             
             run_id = cursor.lastrowid
             conn.commit()
@@ -286,6 +531,8 @@ def main():
                 
     finally:
         conn.close()
+        if sys.stderr is not None:
+            sys.stderr.flush()
 
 if __name__ == '__main__':
     main()
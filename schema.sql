@@ -3,17 +3,32 @@ CREATE TABLE IF NOT EXISTS scan_runs (
     run_identifier TEXT NOT NULL,
     drive_name TEXT NOT NULL,
     base_path TEXT NOT NULL,
+    hash_algorithm TEXT NOT NULL DEFAULT 'md5',
     scan_timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
 );
 
+CREATE TABLE IF NOT EXISTS directories (
+    dir_id INTEGER PRIMARY KEY,
+    parent_id INTEGER NOT NULL, -- 0 for top-level path components
+    name TEXT NOT NULL,
+    UNIQUE (parent_id, name)
+);
+
 CREATE TABLE IF NOT EXISTS file_entries (
-    file_id INTEGER PRIMARY KEY AUTOINCREMENT,
-    run_id INTEGER,
+    run_id INTEGER NOT NULL,
+    dir_id INTEGER NOT NULL,
     filename TEXT NOT NULL,
-    full_path TEXT NOT NULL,
-    relative_path TEXT NOT NULL,
-    md5_hash TEXT NOT NULL,
-    created_time DATETIME NOT NULL,
-    modified_time DATETIME NOT NULL,
-    FOREIGN KEY (run_id) REFERENCES scan_runs(run_id)
-);
+    size INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    content_hash BLOB,
+    created_time REAL NOT NULL,
+    modified_time REAL NOT NULL,
+    PRIMARY KEY (run_id, dir_id, filename),
+    FOREIGN KEY (run_id) REFERENCES scan_runs(run_id) ON DELETE CASCADE,
+    FOREIGN KEY (dir_id) REFERENCES directories(dir_id)
+) WITHOUT ROWID, STRICT;
+
+CREATE INDEX IF NOT EXISTS idx_fe_size ON file_entries(size);
+CREATE INDEX IF NOT EXISTS idx_fe_path ON file_entries(dir_id, filename, size, modified_time, inode);
+CREATE INDEX IF NOT EXISTS idx_fe_filename_hash ON file_entries(filename, content_hash);
+CREATE INDEX IF NOT EXISTS idx_sr_base_path ON scan_runs(base_path);